@@ -0,0 +1,141 @@
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Defaults size the global cap to the SQLAlchemy pool (pool_size 5 + max_overflow 10),
+# so admitted requests never wait on pool_timeout for a connection
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "15"))
+# Share of the cap that writes and admin routes may use; the rest is kept for reads
+LOW_PRIORITY_IN_FLIGHT = int(os.getenv("LOW_PRIORITY_IN_FLIGHT", "5"))
+# Per-client token bucket: sustained requests per second and burst size
+CLIENT_RATE = float(os.getenv("CLIENT_RATE", "20"))
+CLIENT_BURST = float(os.getenv("CLIENT_BURST", "40"))
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Reads that take a POST body; they keep read priority
+READ_ROUTES = {("POST", "/pricing/batch")}
+LOW_PRIORITY_PREFIXES = ("/admin/",)
+# Cheap diagnostics that must stay reachable while the API is overloaded; they skip
+# the in-flight cap but are still rate limited per client
+CAPACITY_EXEMPT_PREFIXES = ("/admin/profiler/",)
+# Least recently seen clients are forgotten once this many are tracked
+MAX_TRACKED_CLIENTS = 10000
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def take(self, now: float, cost: float = 1.0):
+        """Spend tokens; returns 0 on success or the seconds until enough are available."""
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class AdmissionControlMiddleware:
+    """
+    Rejects requests up front instead of letting them queue behind the database pool.
+
+    Each client gets a token bucket (`429` when empty), and the worker admits at
+    most `max_in_flight` requests at once (`503` beyond that). Writes and admin
+    routes are low priority and only admitted while fewer than
+    `low_priority_in_flight` requests are running, keeping the rest of the
+    capacity for reads, including the POST reads in `READ_ROUTES`. Both
+    responses carry `Retry-After`. Limits are per worker process.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        low_priority_in_flight: int = LOW_PRIORITY_IN_FLIGHT,
+        client_rate: float = CLIENT_RATE,
+        client_burst: float = CLIENT_BURST
+    ):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.low_priority_in_flight = min(low_priority_in_flight, max_in_flight)
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.in_flight = 0
+        self.buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._is_preflight(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # Runs on the event loop thread only, so the counters need no locking.
+        # Capacity is checked first so a shed request doesn't spend the client's tokens
+        if not scope["path"].startswith(CAPACITY_EXEMPT_PREFIXES):
+            limit = self.low_priority_in_flight if self._is_low_priority(scope) else self.max_in_flight
+            if self.in_flight >= limit:
+                logger.warning(f"Shedding {scope['method']} {scope['path']} ({self.in_flight} requests in flight)")
+                await self._reject(send, 503, "Server is busy, please retry", 1)
+                return
+
+        retry_after = self._take_token(self._client_key(scope), time.monotonic())
+        if retry_after:
+            await self._reject(send, 429, "Too many requests from this client", retry_after)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    def _client_key(self, scope):
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _is_preflight(self, scope):
+        # CORS preflights carry no work for the app and must not spend tokens or slots
+        if scope["method"] != "OPTIONS":
+            return False
+        return any(name == b"access-control-request-method" for name, _ in scope.get("headers", []))
+
+    def _is_low_priority(self, scope):
+        if scope["path"].startswith(LOW_PRIORITY_PREFIXES):
+            return True
+        return scope["method"] not in READ_METHODS and (scope["method"], scope["path"]) not in READ_ROUTES
+
+    def _take_token(self, key: str, now: float):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.client_rate, self.client_burst, now)
+            # LRU bound: forgetting the least recently seen client is O(1)
+            if len(self.buckets) > MAX_TRACKED_CLIENTS:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        wait = bucket.take(now)
+        return math.ceil(wait) if wait else 0
+
+    async def _reject(self, send, status_code: int, detail: str, retry_after: int):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
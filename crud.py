@@ -1,5 +1,66 @@
+from datetime import datetime
+from sqlalchemy import func, insert, literal, select, update
 from sqlalchemy.orm import Session
-from models import PricingTable
+from models import PricingTable, PricingHistory, CatalogVersion
+
+# Columns copied from PricingTable into PricingHistory on every change
+PRICING_HISTORY_FIELDS = [
+    "meal_plan",
+    "price",
+    "food_type",
+    "people_count",
+    "frequency",
+    "meal_details",
+    "utensil_washing_price",
+    "utensil_washing_commission",
+    "children_special_price",
+    "preference_community_percentage",
+    "kitchen_platform_price",
+    "created_at"
+]
+
+def bump_catalog_version(db: Session):
+    # Row-locks the version until commit, so concurrent writers get versions in commit order
+    result = db.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1))
+    if result.rowcount == 0:
+        db.add(CatalogVersion(id=1, version=1))
+
+def ensure_catalog_version(db: Session):
+    if db.get(CatalogVersion, 1) is None:
+        db.add(CatalogVersion(id=1, version=0))
+
+def _add_history(db: Session, db_pricing: PricingTable, is_deleted: bool = False):
+    # Queued on the session so it is written in the same transaction as the change
+    bump_catalog_version(db)
+    db.add(PricingHistory(
+        pricing_id=db_pricing.id,
+        is_deleted=is_deleted,
+        **{field: getattr(db_pricing, field) for field in PRICING_HISTORY_FIELDS}
+    ))
+
+def _history_from_select(is_deleted: bool, only_missing: bool = False):
+    columns = ["pricing_id", *PRICING_HISTORY_FIELDS, "is_deleted"]
+    source = select(
+        PricingTable.id,
+        *[getattr(PricingTable, field) for field in PRICING_HISTORY_FIELDS],
+        literal(is_deleted)
+    )
+    if only_missing:
+        source = source.where(~select(PricingHistory.id).where(PricingHistory.pricing_id == PricingTable.id).exists())
+    return insert(PricingHistory).from_select(columns, source)
+
+def record_pricing_snapshot(db: Session):
+    # Append a history row for every current pricing plan in one statement
+    db.execute(_history_from_select(is_deleted=False))
+
+def backfill_pricing_history(db: Session):
+    # Snapshot plans that have no history yet (e.g. created before history existed);
+    # safe to run repeatedly, plans already in history are skipped
+    db.execute(_history_from_select(is_deleted=False, only_missing=True))
+
+def record_pricing_tombstones(db: Session):
+    # Mark every current pricing plan as deleted in history in one statement
+    db.execute(_history_from_select(is_deleted=True))
 
 def create_pricing(
     db: Session,
@@ -29,16 +90,87 @@ def create_pricing(
         kitchen_platform_price=kitchen_platform_price
     )
     db.add(db_pricing)
+    db.flush()  # Assigns the id the history row points at
+    _add_history(db, db_pricing)
     db.commit()
-    db.refresh(db_pricing)
     return db_pricing
 
 def get_pricing(db: Session, skip: int = 0, limit: int = 100):
     return db.query(PricingTable).offset(skip).limit(limit).all()
 
+def count_pricing(db: Session):
+    return db.query(func.count(PricingTable.id)).scalar()
+
+def get_catalog_version(db: Session):
+    # Unlike MAX(pricing_history.id), this never goes backwards when writers commit out of order
+    return db.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar() or 0
+
+# (catalog version, stats) of the latest computation, reused until the version changes.
+# Replaced as one tuple so concurrent requests never see a version without its stats
+_stats_cache = None
+
+def _price_summary(db: Session, group_column=None):
+    # Aggregates are computed in SQL; only one row per group comes back
+    columns = [
+        func.count(PricingTable.id).label("count"),
+        func.min(PricingTable.price).label("min_price"),
+        func.max(PricingTable.price).label("max_price"),
+        func.avg(PricingTable.price).label("avg_price")
+    ]
+    if group_column is None:
+        rows = [db.query(*columns).one()]
+    else:
+        rows = db.query(group_column, *columns).group_by(group_column).order_by(group_column).all()
+    summaries = []
+    for row in rows:
+        summary = dict(row._mapping)
+        if summary["avg_price"] is not None:
+            summary["avg_price"] = float(summary["avg_price"])
+        summaries.append(summary)
+    return summaries
+
+def get_pricing_stats(db: Session):
+    global _stats_cache
+    version = get_catalog_version(db)
+    cached = _stats_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    stats = {
+        "catalog_version": version,
+        **_price_summary(db)[0],
+        "by_food_type": _price_summary(db, PricingTable.food_type),
+        "by_people_count": _price_summary(db, PricingTable.people_count)
+    }
+    _stats_cache = (version, stats)
+    return stats
+
 def get_pricing_by_id(db: Session, pricing_id: int):
     return db.query(PricingTable).filter(PricingTable.id == pricing_id).first()
 
+def get_pricing_as_of(db: Session, pricing_id: int, as_of: datetime):
+    # Latest history row at or before as_of; a single seek on the history index
+    entry = (
+        db.query(PricingHistory)
+        .filter(PricingHistory.pricing_id == pricing_id, PricingHistory.valid_from <= as_of)
+        .order_by(PricingHistory.valid_from.desc(), PricingHistory.id.desc())
+        .first()
+    )
+    if entry is None or entry.is_deleted:
+        return None
+    # Same shape as a PricingTable row, so callers can't mistake the history id for the plan id
+    return {"id": entry.pricing_id, **{field: getattr(entry, field) for field in PRICING_HISTORY_FIELDS}}
+
+def get_pricing_by_ids(db: Session, pricing_ids: list[int]):
+    # Resolve all ids in a single query, then restore the requested order
+    if not pricing_ids:
+        return [], []
+    rows = db.query(PricingTable).filter(PricingTable.id.in_(set(pricing_ids))).all()
+    by_id = {row.id: row for row in rows}
+    found = [by_id[pricing_id] for pricing_id in pricing_ids if pricing_id in by_id]
+    missing = [pricing_id for pricing_id in pricing_ids if pricing_id not in by_id]
+    return found, missing
+
 def update_pricing(
     db: Session,
     pricing_id: int,
@@ -75,13 +207,16 @@ def update_pricing(
             if value is not None:
                 setattr(db_pricing, key, value)
         
-        db.commit()
-        db.refresh(db_pricing)
+        # Unchanged plans get no history row and keep the stats cache valid
+        if db.is_modified(db_pricing):
+            _add_history(db, db_pricing)
+            db.commit()
     return db_pricing
 
 def delete_pricing(db: Session, pricing_id: int):
     db_pricing = get_pricing_by_id(db, pricing_id)
     if db_pricing:
+        _add_history(db, db_pricing, is_deleted=True)
         db.delete(db_pricing)
         db.commit()
         return True
@@ -2,6 +2,7 @@ import pandas as pd
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 from models import Base, PricingTable, AdditionalServicesPricing
+from crud import bump_catalog_version, record_pricing_snapshot, record_pricing_tombstones
 import logging
 
 # Set up logging
@@ -74,9 +75,15 @@ def import_excel_to_db():
         db = SessionLocal()
         
         try:
-            # Clear existing data
+            # Close out the current plans in history, then clear existing data
+            record_pricing_tombstones(db)
             db.query(PricingTable).delete()
             
+            # Load additional services pricing once instead of per imported row
+            additional_services_by_people = {}
+            for service in db.query(AdditionalServicesPricing).order_by(AdditionalServicesPricing.id.desc()):
+                additional_services_by_people[service.people_count] = service
+            
             # Process data in chunks of 8 columns (7 people + header)
             for chunk_start in range(0, len(df.columns), 8):
                 chunk = df.iloc[:, chunk_start:chunk_start + 8]
@@ -114,9 +121,7 @@ def import_excel_to_db():
                         continue
                     
                     # Get additional services pricing
-                    additional_services = db.query(AdditionalServicesPricing).filter(
-                        AdditionalServicesPricing.people_count == (i + 1 if i < 6 else 7)
-                    ).first()
+                    additional_services = additional_services_by_people.get(i + 1 if i < 6 else 7)
                     
                     pricing = PricingTable(
                         meal_plan=f"{plan_type} - {num_people} people",
@@ -134,6 +139,11 @@ def import_excel_to_db():
                     db.add(pricing)
                     logger.info(f"Added pricing: {plan_type} - {num_people} people, Price: {price}")
             
+            # Record the imported plans in history alongside the import itself
+            db.flush()
+            record_pricing_snapshot(db)
+            bump_catalog_version(db)
+            
             # Commit changes
             db.commit()
             logger.info("Data imported successfully!")
@@ -1,10 +1,18 @@
-from fastapi import FastAPI, Depends, Body, HTTPException
+from fastapi import FastAPI, Depends, Body, HTTPException, Query, Response, Header
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from crud import create_pricing, get_pricing, get_pricing_by_id, update_pricing, delete_pricing
+from database import SessionLocal, engine
+from models import PricingHistory, CatalogVersion
+from crud import create_pricing, get_pricing, count_pricing, get_pricing_stats, get_pricing_by_id, get_pricing_by_ids, get_pricing_as_of, update_pricing, delete_pricing, backfill_pricing_history, ensure_catalog_version
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
+from profiler import profiler, ProfilerMiddleware
+from admission import AdmissionControlMiddleware
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from datetime import datetime
 import logging
+import os
+import secrets
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,12 +44,60 @@ class PricingUpdate(BaseModel):
     preference_community_percentage: float | None = None
     kitchen_platform_price: float | None = None
 
+class PricingBatchRequest(BaseModel):
+    ids: list[int]
+
+class ProfilerStart(BaseModel):
+    duration_seconds: float | None = 30
+    max_requests: int | None = None
+    interval_ms: float = 10.0
+
+# Longest a single profiling session may run, whatever limits were requested
+MAX_PROFILE_SECONDS = 300
+# Shortest time between samples; each sample walks every thread's stack
+MIN_PROFILE_INTERVAL_MS = 5
+
+# Upper bound on ids resolved by a single batch request
+MAX_BATCH_IDS = 100
+
+def prepare_pricing_history():
+    # Every write appends to pricing_history and bumps catalog_version, so make sure
+    # both exist and history holds a snapshot of plans created before it was introduced
+    try:
+        PricingHistory.__table__.create(bind=engine, checkfirst=True)
+        CatalogVersion.__table__.create(bind=engine, checkfirst=True)
+        db = SessionLocal()
+        try:
+            backfill_pricing_history(db)
+            ensure_catalog_version(db)
+            db.commit()
+        finally:
+            db.close()
+    except Exception as e:
+        # Serving without history would fail every write, so refuse to start instead
+        logger.error(f"Error preparing pricing history: {str(e)}")
+        raise
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    prepare_pricing_history()
+    yield
+
 app = FastAPI(
     title="Meal Delivery API",
     description="API for managing meal delivery pricing and services",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Counts requests for the sampling profiler; added first so it runs inside admission
+# control and shed requests don't use up a profiling session's request budget
+app.add_middleware(ProfilerMiddleware)
+
+# Sheds load before requests queue behind the database pool; see admission.py for limits.
+# Registered before CORS so CORS wraps it and 429/503 responses carry CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -49,6 +105,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Total-Count", "Retry-After"],  # Lets browser clients read pagination totals and backoff hints
 )
 
 # Dependency
@@ -59,6 +116,13 @@ def get_db():
     finally:
         db.close()
 
+def require_admin(x_admin_token: str | None = Header(None)):
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 @app.get("/")
 def read_root():
     return {
@@ -66,7 +130,11 @@ def read_root():
         "documentation": "Visit /docs for API documentation",
         "endpoints": {
             "GET /pricing/": "Get all pricing plans",
+            "GET /pricing/stats": "Get catalog counts and price summaries",
+            "GET /pricing/batch?ids=1,2,3": "Get many pricing plans by ID",
+            "POST /pricing/batch": "Get many pricing plans by ID (JSON body)",
             "GET /pricing/{id}": "Get a specific pricing plan",
+            "GET /pricing/{id}?as_of=": "Get a pricing plan as it was at a point in time",
             "POST /pricing/": "Add a new pricing plan",
             "PUT /pricing/{id}": "Update a pricing plan",
             "DELETE /pricing/{id}": "Delete a pricing plan"
@@ -109,26 +177,88 @@ def add_pricing(pricing: PricingCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/pricing/", summary="Get all pricing plans")
-def read_pricing(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_pricing(response: Response, skip: int = 0, limit: int = 100, include_total: bool = False, db: Session = Depends(get_db)):
     """
     Retrieve all pricing plans with pagination:
     - **skip**: Number of records to skip (default: 0)
     - **limit**: Maximum number of records to return (default: 100)
+    - **include_total**: Add an `X-Total-Count` header with the total number of plans (default: false)
     """
     try:
+        if include_total:
+            response.headers["X-Total-Count"] = str(count_pricing(db))
         return get_pricing(db=db, skip=skip, limit=limit)
     except Exception as e:
         logger.error(f"Error getting pricing: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/pricing/stats", summary="Get catalog counts and price summaries")
+def read_pricing_stats(db: Session = Depends(get_db)):
+    """
+    Retrieve the number of pricing plans and min/max/avg price, overall and
+    grouped by food type and by number of people. Results are cached until the
+    catalog changes.
+    """
+    try:
+        return get_pricing_stats(db)
+    except Exception as e:
+        logger.error(f"Error getting pricing stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def resolve_pricing_batch(ids: list[int], db: Session):
+    # Drop duplicates while keeping the order the caller asked for
+    unique_ids = list(dict.fromkeys(ids))
+    if not unique_ids:
+        raise HTTPException(status_code=400, detail="At least one pricing ID is required")
+    if len(unique_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} pricing IDs can be requested at once")
+    try:
+        found, missing = get_pricing_by_ids(db, unique_ids)
+        return {"items": found, "missing": missing}
+    except Exception as e:
+        logger.error(f"Error getting pricing batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/pricing/batch", summary="Get many pricing plans by ID")
+def read_pricing_batch(ids: str = Query(..., description="Comma-separated pricing plan IDs"), db: Session = Depends(get_db)):
+    """
+    Retrieve several pricing plans with a single query:
+    - **ids**: Comma-separated pricing plan IDs, e.g. `1,2,3`
+
+    Plans are returned in the requested order; unknown IDs are listed under `missing`.
+    Repeated IDs are collapsed to their first occurrence, so `items` does not line
+    up position-for-position with a request that contains duplicates.
+    """
+    try:
+        pricing_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    return resolve_pricing_batch(pricing_ids, db)
+
+@app.post("/pricing/batch", summary="Get many pricing plans by ID")
+def read_pricing_batch_body(request: PricingBatchRequest, db: Session = Depends(get_db)):
+    """
+    Retrieve several pricing plans with a single query:
+    - **ids**: List of pricing plan IDs
+
+    Plans are returned in the requested order; unknown IDs are listed under `missing`.
+    Repeated IDs are collapsed to their first occurrence, so `items` does not line
+    up position-for-position with a request that contains duplicates.
+    """
+    return resolve_pricing_batch(request.ids, db)
+
 @app.get("/pricing/{pricing_id}", summary="Get a specific pricing plan")
-def read_pricing_by_id(pricing_id: int, db: Session = Depends(get_db)):
+def read_pricing_by_id(pricing_id: int, as_of: datetime | None = None, db: Session = Depends(get_db)):
     """
     Retrieve a specific pricing plan by ID:
     - **pricing_id**: The ID of the pricing plan to retrieve
+    - **as_of**: Return the plan as it was at this date/time, from price history (optional)
     """
     try:
-        pricing = get_pricing_by_id(db, pricing_id)
+        if as_of is not None:
+            pricing = get_pricing_as_of(db, pricing_id, as_of)
+        else:
+            pricing = get_pricing_by_id(db, pricing_id)
         if pricing is None:
             raise HTTPException(status_code=404, detail="Pricing plan not found")
         return pricing
@@ -195,3 +325,62 @@ def delete_pricing_plan(pricing_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         logger.error(f"Error deleting pricing: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/admin/profiler/start", summary="Start the sampling profiler", dependencies=[Depends(require_admin)])
+def start_profiler(options: ProfilerStart = Body(ProfilerStart())):
+    """
+    Start sampling stacks on this worker until a limit is reached (requires `X-Admin-Token`):
+    - **duration_seconds**: Stop after this many seconds (default: 30, max: 300)
+    - **max_requests**: Stop after this many requests have been handled (optional)
+    - **interval_ms**: Time between samples in milliseconds (default: 10, min: 5)
+
+    Sessions always stop after 300 seconds, even if `max_requests` is not reached.
+    """
+    if options.duration_seconds is not None and not 0 < options.duration_seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"duration_seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+    if options.max_requests is not None and options.max_requests < 1:
+        raise HTTPException(status_code=400, detail="max_requests must be at least 1")
+    if options.interval_ms < MIN_PROFILE_INTERVAL_MS:
+        raise HTTPException(status_code=400, detail=f"interval_ms must be at least {MIN_PROFILE_INTERVAL_MS}")
+    try:
+        profiler.start(
+            duration_seconds=min(options.duration_seconds or MAX_PROFILE_SECONDS, MAX_PROFILE_SECONDS),
+            max_requests=options.max_requests,
+            interval_ms=options.interval_ms
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.status()
+
+@app.post("/admin/profiler/stop", summary="Stop the sampling profiler", dependencies=[Depends(require_admin)])
+def stop_profiler():
+    """
+    Stop sampling on this worker; collected samples are kept for download.
+    """
+    profiler.stop()
+    return profiler.status()
+
+@app.get("/admin/profiler/status", summary="Get sampling profiler status", dependencies=[Depends(require_admin)])
+def read_profiler_status():
+    """
+    Report whether the profiler is running on this worker and how many samples it holds.
+    """
+    return profiler.status()
+
+@app.get("/admin/profiler/profile", summary="Download the collected profile", dependencies=[Depends(require_admin)])
+def download_profile(format: str = "speedscope"):
+    """
+    Download the samples collected on this worker:
+    - **format**: `speedscope` for speedscope JSON or `collapsed` for folded stacks (flamegraph.pl)
+    """
+    if format == "collapsed":
+        return PlainTextResponse(
+            profiler.collapsed(),
+            headers={"Content-Disposition": "attachment; filename=profile.folded"}
+        )
+    if format == "speedscope":
+        return JSONResponse(
+            profiler.speedscope(),
+            headers={"Content-Disposition": "attachment; filename=profile.speedscope.json"}
+        )
+    raise HTTPException(status_code=400, detail="format must be 'speedscope' or 'collapsed'")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 
@@ -24,6 +24,9 @@ class PricingTable(Base):
 
     created_at = Column(DateTime, default=func.now())
 
+    # Fetch created_at via RETURNING on insert instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
+
 class AdditionalServicesPricing(Base):
     __tablename__ = 'additional_services_pricing'
 
@@ -45,4 +48,38 @@ class AdditionalServicesPricing(Base):
     
     created_at = Column(DateTime, default=func.now())
 
+class PricingHistory(Base):
+    __tablename__ = 'pricing_history'
+
+    # Append-only: one row per change to a pricing plan, never updated in place
+    id = Column(Integer, primary_key=True, index=True)
+    pricing_id = Column(Integer, nullable=False)  # PricingTable.id at the time of the change
+    meal_plan = Column(String)
+    price = Column(Float)
+    food_type = Column(String)
+    people_count = Column(Integer)
+    frequency = Column(String)
+    meal_details = Column(String)
+
+    utensil_washing_price = Column(Float)
+    utensil_washing_commission = Column(Float)
+    children_special_price = Column(Float)
+    preference_community_percentage = Column(Float)
+    kitchen_platform_price = Column(Float)
+
+    created_at = Column(DateTime)  # PricingTable.created_at of the plan
+
+    is_deleted = Column(Boolean, default=False, nullable=False)  # Plan was removed at valid_from
+    valid_from = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Point-in-time lookups seek straight to the latest row at or before a date
+        Index('ix_pricing_history_pricing_id_valid_from', 'pricing_id', 'valid_from', 'id'),
+    )
+
+class CatalogVersion(Base):
+    __tablename__ = 'catalog_version'
 
+    # Single row bumped by every pricing change; the row lock orders versions by commit
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
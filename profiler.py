@@ -0,0 +1,209 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames in these files mean the thread is parked, not doing work
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def _is_idle(frame):
+    return os.path.basename(frame.f_code.co_filename) in IDLE_FILES
+
+
+def _stack_key(frame):
+    # Root-first tuple of (function, file, first line) for one thread's stack
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread in this worker at a fixed interval.
+
+    Nothing runs while the profiler is off; once started, a background thread
+    collects stacks until the time limit passes or the request budget is spent.
+    State is per process, so each worker has to be profiled separately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop_event = None
+        self._thread = None
+        self._session = 0
+        self._stacks = Counter()
+        self.interval = 0.005
+        self.started_at = None
+        self.stopped_at = None
+        self.deadline = None
+        self.remaining_requests = None
+
+    @property
+    def active(self):
+        return self._thread is not None
+
+    @property
+    def session(self):
+        """Id of the running session, or None while the profiler is off."""
+        with self._lock:
+            return self._session if self._thread is not None else None
+
+    def start(self, duration_seconds: float | None = None, max_requests: int | None = None, interval_ms: float = 5.0):
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("Profiler is already running")
+            self._session += 1
+            self._stacks = Counter()
+            self.interval = interval_ms / 1000.0
+            self.started_at = time.time()
+            self.stopped_at = None
+            self.deadline = self.started_at + duration_seconds if duration_seconds else None
+            self.remaining_requests = max_requests
+            # Each session gets its own event, so a new session can never revive an old sampler
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(self._stop_event, self.interval, self.deadline),
+                name="sampling-profiler",
+                daemon=True
+            )
+            self._thread.start()
+        logger.info(f"Profiler started (duration={duration_seconds}s, max_requests={max_requests}, interval={interval_ms}ms)")
+
+    def stop(self):
+        self._stop_session()
+
+    def _stop_session(self, thread=None):
+        # With a thread given, only stop if that thread still owns the current session
+        with self._lock:
+            current = self._thread
+            if current is None or (thread is not None and current is not thread):
+                return
+            self._thread = None
+            self.stopped_at = time.time()
+            self._stop_event.set()
+        if current is not threading.current_thread():
+            current.join()
+        logger.info(f"Profiler stopped after {self.sample_count} samples")
+
+    def request_finished(self, session: int):
+        # Only requests that started during this session count against its budget
+        with self._lock:
+            if self._thread is None or session != self._session or self.remaining_requests is None:
+                return
+            self.remaining_requests -= 1
+            done = self.remaining_requests <= 0
+        if done:
+            self.stop()
+
+    def _run(self, stop_event, interval, deadline):
+        own_id = threading.get_ident()
+        while not stop_event.wait(interval):
+            if deadline is not None and time.time() >= deadline:
+                self._stop_session(threading.current_thread())
+                break
+            samples = [
+                _stack_key(frame)
+                for thread_id, frame in sys._current_frames().items()
+                if thread_id != own_id and not _is_idle(frame)
+            ]
+            with self._lock:
+                if stop_event.is_set():
+                    break
+                self._stacks.update(samples)
+
+    @property
+    def sample_count(self):
+        with self._lock:
+            return sum(self._stacks.values())
+
+    def status(self):
+        return {
+            "active": self.active,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "deadline": self.deadline,
+            "remaining_requests": self.remaining_requests,
+            "interval_ms": self.interval * 1000.0,
+            "samples": self.sample_count
+        }
+
+    def collapsed(self):
+        """Folded stacks, one `frame;frame;frame count` line per unique stack (flamegraph.pl / speedscope)."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        lines = []
+        for stack, count in stacks:
+            frames = ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self):
+        """Speedscope "sampled" profile; weights are seconds of wall time."""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        frame_index = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, count in stacks:
+            sample = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    name, filename, line = frame
+                    frames.append({"name": name, "file": filename, "line": line})
+                sample.append(frame_index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"Meal Delivery API worker {os.getpid()}",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": "Meal Delivery API profile",
+            "exporter": "md-backend-profiler"
+        }
+
+
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    """
+    Counts handled requests against the profiler's `max_requests` budget.
+
+    Plain ASGI so that, while the profiler is off, a request costs one
+    attribute check on top of the app itself.
+    """
+
+    def __init__(self, app, sampler: SamplingProfiler = profiler):
+        self.app = app
+        self.sampler = sampler
+
+    async def __call__(self, scope, receive, send):
+        if not self.sampler.active or scope["type"] != "http" or scope["path"].startswith("/admin/"):
+            await self.app(scope, receive, send)
+            return
+        session = self.sampler.session
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if session is not None:
+                self.sampler.request_finished(session)
@@ -0,0 +1,184 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+import admission
+import main
+from admission import AdmissionControlMiddleware
+
+
+def build_app(**limits):
+    app = FastAPI()
+    # Same registration order as main.py: CORS wraps admission control
+    app.add_middleware(AdmissionControlMiddleware, **limits)
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], expose_headers=["Retry-After"])
+    app.state.release = asyncio.Event()
+
+    @app.get("/slow")
+    async def slow_read():
+        await app.state.release.wait()
+        return {"ok": True}
+
+    @app.post("/slow")
+    async def slow_write():
+        await app.state.release.wait()
+        return {"ok": True}
+
+    @app.post("/pricing/batch")
+    async def batch_read():
+        return {"ok": True}
+
+    @app.get("/admin/profiler/status")
+    async def profiler_status():
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast_read():
+        return {"ok": True}
+
+    return app
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def hold_requests(app, requests, then):
+    # Keep `requests` in flight while `then` runs against the same app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        held = [asyncio.create_task(client.request(method, path)) for method, path in requests]
+        await asyncio.sleep(0.05)
+        try:
+            return await then(client)
+        finally:
+            app.state.release.set()
+            await asyncio.gather(*held)
+
+
+def test_global_cap_sheds_with_503():
+    app = build_app(max_in_flight=2, low_priority_in_flight=2, client_burst=100)
+
+    async def check(client):
+        return await client.get("/fast")
+
+    response = run(hold_requests(app, [("GET", "/slow"), ("GET", "/slow")], check))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_reads_keep_capacity_reserved_from_writes():
+    app = build_app(max_in_flight=3, low_priority_in_flight=1, client_burst=100)
+
+    async def check(client):
+        return await client.post("/slow"), await client.get("/fast")
+
+    write, read = run(hold_requests(app, [("POST", "/slow")], check))
+    assert write.status_code == 503
+    assert read.status_code == 200
+
+
+def test_client_token_bucket_returns_429():
+    app = build_app(max_in_flight=10, client_rate=1, client_burst=2)
+
+    async def check(client):
+        return [await client.get("/fast") for _ in range(3)]
+
+    responses = run(hold_requests(app, [], check))
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert int(responses[-1].headers["Retry-After"]) >= 1
+
+
+def test_batch_lookup_keeps_read_priority():
+    app = build_app(max_in_flight=3, low_priority_in_flight=1, client_burst=100)
+
+    async def check(client):
+        return await client.post("/pricing/batch", json={"ids": [1]})
+
+    response = run(hold_requests(app, [("POST", "/slow")], check))
+    assert response.status_code == 200
+
+
+def test_shed_requests_do_not_spend_client_tokens():
+    app = build_app(max_in_flight=1, client_rate=0.001, client_burst=2)
+
+    async def check(client):
+        shed = [await client.get("/fast") for _ in range(5)]
+        app.state.release.set()
+        await asyncio.sleep(0.05)
+        return shed, await client.get("/fast")
+
+    # The held request spends one of the two tokens
+    shed, admitted = run(hold_requests(app, [("GET", "/slow")], check))
+    assert [response.status_code for response in shed] == [503] * 5
+    assert admitted.status_code == 200
+
+
+def test_main_app_wraps_admission_control_in_cors():
+    order = [middleware.cls for middleware in main.app.user_middleware]
+    # user_middleware is outermost first
+    assert order.index(CORSMiddleware) < order.index(AdmissionControlMiddleware)
+
+
+def test_rejections_carry_cors_headers_and_preflights_are_free():
+    app = build_app(max_in_flight=10, client_rate=0.001, client_burst=1)
+    origin = {"Origin": "http://example.com"}
+    preflight = dict(origin, **{"Access-Control-Request-Method": "GET"})
+
+    async def check(client):
+        preflights = [await client.options("/fast", headers=preflight) for _ in range(3)]
+        return preflights, await client.get("/fast", headers=origin), await client.get("/fast", headers=origin)
+
+    preflights, admitted, limited = run(hold_requests(app, [], check))
+    assert [response.status_code for response in preflights] == [200] * 3
+    assert admitted.status_code == 200
+    assert limited.status_code == 429
+    assert limited.headers["access-control-allow-origin"] == "*"
+    assert "Retry-After" in limited.headers["access-control-expose-headers"]
+
+
+def test_profiler_routes_skip_capacity_but_not_rate_limit():
+    app = build_app(max_in_flight=1, client_rate=0.001, client_burst=2)
+
+    async def check(client):
+        return [await client.get("/admin/profiler/status") for _ in range(2)]
+
+    # The held request spends one of the two tokens
+    responses = run(hold_requests(app, [("GET", "/slow")], check))
+    assert [response.status_code for response in responses] == [200, 429]
+
+
+def test_client_buckets_are_bounded(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_TRACKED_CLIENTS", 3)
+    middleware = AdmissionControlMiddleware(app=None)
+    for client in ["a", "b", "c"]:
+        middleware._take_token(client, 0.0)
+    middleware._take_token("a", 1.0)
+    middleware._take_token("d", 2.0)
+    # "b" is the least recently seen client and is forgotten first
+    assert list(middleware.buckets) == ["c", "a", "d"]
+
+
+def test_preflights_bypass_admission_without_cors_in_front():
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionControlMiddleware(ok, max_in_flight=0, client_rate=0.001, client_burst=0)
+    scope = {
+        "type": "http",
+        "method": "OPTIONS",
+        "path": "/fast",
+        "headers": [(b"access-control-request-method", b"GET")],
+        "client": ("1.2.3.4", 1234)
+    }
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    run(middleware(scope, None, send))
+    assert sent[0]["status"] == 204
+    assert middleware.buckets == {}
@@ -0,0 +1,148 @@
+"""Query-count and latency budgets for the API routes and the Excel import.
+
+Each test runs the app in-process against the test database and fails if a
+route issues more SQL statements than its budget, e.g. when an N+1 lookup or
+an extra refresh round trip is reintroduced.
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import crud
+
+# Wall-clock ceilings; generous so they only catch gross regressions
+ROUTE_TIME_BUDGET = float(os.getenv("ROUTE_TIME_BUDGET", "0.5"))
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "10"))
+
+
+def assert_budget(queries, max_statements, time_budget=ROUTE_TIME_BUDGET):
+    assert len(queries) <= max_statements, (
+        f"expected at most {max_statements} statements, got {len(queries)}:\n" + "\n".join(queries.statements)
+    )
+    assert queries.elapsed <= time_budget, f"took {queries.elapsed:.3f}s, budget is {time_budget}s"
+
+
+def test_list_pricing_is_one_query(client, queries, seeded_pricing):
+    with queries.count():
+        response = client.get("/pricing/", params={"limit": 1000})
+    assert response.status_code == 200
+    assert len(response.json()) == len(seeded_pricing)
+    assert_budget(queries, 1)
+
+
+def test_list_pricing_with_total_adds_one_count_query(client, queries, seeded_pricing):
+    with queries.count():
+        response = client.get("/pricing/", params={"limit": 5, "include_total": True})
+    assert response.headers["X-Total-Count"] == str(len(seeded_pricing))
+    assert_budget(queries, 2)
+
+
+def test_get_pricing_by_id_is_one_query(client, queries, seeded_pricing):
+    with queries.count():
+        response = client.get(f"/pricing/{seeded_pricing[0]}")
+    assert response.status_code == 200
+    assert_budget(queries, 1)
+
+
+def test_get_pricing_as_of_is_one_query(client, queries, seeded_pricing):
+    as_of = (datetime.utcnow() + timedelta(minutes=1)).isoformat()
+    with queries.count():
+        response = client.get(f"/pricing/{seeded_pricing[0]}", params={"as_of": as_of})
+    assert response.status_code == 200
+    assert_budget(queries, 1)
+
+
+def test_batch_lookup_is_one_query(client, queries, seeded_pricing):
+    requested = list(reversed(seeded_pricing)) + [999999]
+    with queries.count():
+        response = client.post("/pricing/batch", json={"ids": requested})
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == requested[:-1]
+    assert body["missing"] == [999999]
+    assert_budget(queries, 1)
+
+
+def test_stats_are_cached_per_catalog_version(client, queries, seeded_pricing, pricing_payload):
+    with queries.count():
+        first = client.get("/pricing/stats").json()
+    assert first["count"] == len(seeded_pricing)
+    # Version lookup plus one aggregate per summary
+    assert_budget(queries, 4)
+
+    with queries.count():
+        assert client.get("/pricing/stats").json() == first
+    assert_budget(queries, 1)
+
+    client.post("/pricing/", json=pricing_payload)
+    assert client.get("/pricing/stats").json()["count"] == len(seeded_pricing) + 1
+
+
+def test_create_pricing_has_no_refresh_round_trip(client, queries, pricing_payload):
+    with queries.count():
+        response = client.post("/pricing/", json=pricing_payload)
+    assert response.status_code == 200
+    assert response.json()["created_at"] is not None
+    assert queries.for_table("pricing_table", "SELECT") == []
+    # Plan insert, its history row and the catalog version bump
+    assert_budget(queries, 3)
+
+
+def test_update_pricing_has_no_refresh_round_trip(client, queries, seeded_pricing):
+    with queries.count():
+        response = client.put(f"/pricing/{seeded_pricing[0]}", json={"price": 1.0})
+    assert response.json()["price"] == 1.0
+    assert len(queries.for_table("pricing_table", "SELECT")) == 1
+    # Lookup, update, history row and catalog version bump
+    assert_budget(queries, 4)
+
+
+def test_delete_pricing_budget(client, queries, seeded_pricing):
+    with queries.count():
+        response = client.delete(f"/pricing/{seeded_pricing[0]}")
+    assert response.status_code == 200
+    # Lookup, delete, history tombstone and catalog version bump
+    assert_budget(queries, 4)
+
+
+def test_import_issues_constant_statements_per_table(queries, monkeypatch):
+    pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl")
+    import import_excel
+
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import_excel.import_additional_services()
+
+    for _ in range(2):
+        with queries.count():
+            import_excel.import_excel_to_db()
+
+        # Services are loaded once, not once per imported row
+        assert len(queries.for_table("additional_services_pricing", "SELECT")) == 1
+        # Tombstones, delete, bulk insert and snapshot
+        assert len(queries.for_table("pricing_table", "SELECT")) == 0
+        assert len(queries.for_table("pricing_table", "DELETE")) == 1
+        assert len(queries.for_table("INTO pricing_table", "INSERT")) == 1
+        assert len(queries.for_table("INTO pricing_history", "INSERT")) == 2
+        assert len(queries.for_table("catalog_version", "UPDATE")) == 1
+        assert queries.elapsed <= IMPORT_TIME_BUDGET
+
+
+def test_stats_cache_follows_catalog_version(client, db_session, seeded_pricing):
+    client.get("/pricing/stats")
+    version = crud.get_catalog_version(db_session)
+    client.put(f"/pricing/{seeded_pricing[0]}", json={"price": 1.0})
+
+    stats = client.get("/pricing/stats").json()
+    assert stats["catalog_version"] == version + 1
+    assert stats["min_price"] == 1.0
+
+
+def test_stats_cache_never_pairs_version_with_other_stats(client, seeded_pricing, monkeypatch):
+    client.get("/pricing/stats")
+    version, stats = crud._stats_cache
+    assert stats["catalog_version"] == version
+
+    # A stale entry from an interleaved computation is recomputed, not served
+    monkeypatch.setattr(crud, "_stats_cache", (version - 1, {"catalog_version": version - 1}))
+    assert client.get("/pricing/stats").json()["catalog_version"] == version
@@ -0,0 +1,35 @@
+from main import MAX_BATCH_IDS
+
+
+def test_get_form_preserves_order_and_reports_missing(client, seeded_pricing):
+    first, second = seeded_pricing[:2]
+    response = client.get("/pricing/batch", params={"ids": f"{second},999999,{first}"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [second, first]
+    assert body["missing"] == [999999]
+
+
+def test_duplicate_ids_are_collapsed(client, seeded_pricing):
+    first, second = seeded_pricing[:2]
+    body = client.post("/pricing/batch", json={"ids": [first, second, first]}).json()
+    assert [item["id"] for item in body["items"]] == [first, second]
+    assert body["missing"] == []
+
+
+def test_non_integer_ids_are_rejected(client):
+    response = client.get("/pricing/batch", params={"ids": "1,abc"})
+    assert response.status_code == 400
+
+
+def test_empty_id_list_is_rejected(client):
+    assert client.get("/pricing/batch", params={"ids": ""}).status_code == 400
+    assert client.post("/pricing/batch", json={"ids": []}).status_code == 400
+
+
+def test_too_many_ids_are_rejected(client):
+    ids = list(range(1, MAX_BATCH_IDS + 2))
+    assert client.post("/pricing/batch", json={"ids": ids}).status_code == 400
+    assert client.get("/pricing/batch", params={"ids": ",".join(map(str, ids))}).status_code == 400
+    # Duplicates don't count towards the limit
+    assert client.post("/pricing/batch", json={"ids": [1] * (MAX_BATCH_IDS + 1)}).status_code == 200
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from models import PricingHistory, PricingTable
+
+
+def in_future():
+    return (datetime.utcnow() + timedelta(minutes=1)).isoformat()
+
+
+def test_as_of_returns_same_shape_as_current_plan(client, pricing_payload):
+    created = client.post("/pricing/", json=pricing_payload).json()
+    client.put(f"/pricing/{created['id']}", json={"price": 1.0})
+
+    current = client.get(f"/pricing/{created['id']}").json()
+    historical = client.get(f"/pricing/{created['id']}", params={"as_of": in_future()}).json()
+
+    assert historical == current
+    assert historical["id"] == created["id"]
+    assert historical["price"] == 1.0
+    assert historical["created_at"] == created["created_at"]
+
+
+def test_as_of_before_plan_existed_is_404(client, pricing_payload):
+    created = client.post("/pricing/", json=pricing_payload).json()
+    before = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    response = client.get(f"/pricing/{created['id']}", params={"as_of": before})
+    assert response.status_code == 404
+
+
+def test_as_of_after_delete_is_404(client, pricing_payload):
+    created = client.post("/pricing/", json=pricing_payload).json()
+    client.delete(f"/pricing/{created['id']}")
+    response = client.get(f"/pricing/{created['id']}", params={"as_of": in_future()})
+    assert response.status_code == 404
+
+
+
+def test_unchanged_update_adds_no_history(client, db_session, pricing_payload):
+    created = client.post("/pricing/", json=pricing_payload).json()
+    client.put(f"/pricing/{created['id']}", json={})
+    client.put(f"/pricing/{created['id']}", json={"price": pricing_payload["price"]})
+    assert db_session.query(PricingHistory).filter(PricingHistory.pricing_id == created["id"]).count() == 1
+
+
+def test_startup_backfills_plans_without_history(client, database, db_session, pricing_payload):
+    PricingHistory.__table__.drop(bind=database)
+    db_session.add(PricingTable(**pricing_payload))
+    db_session.commit()
+    plan_id = db_session.query(PricingTable.id).scalar()
+
+    main.prepare_pricing_history()
+    response = client.get(f"/pricing/{plan_id}", params={"as_of": in_future()})
+    assert response.status_code == 200
+    assert response.json()["price"] == pricing_payload["price"]
+
+    # Running the backfill again must not duplicate history
+    main.prepare_pricing_history()
+    assert db_session.query(PricingHistory).filter(PricingHistory.pricing_id == plan_id).count() == 1
+
+
+def test_startup_fails_when_history_cannot_be_prepared(monkeypatch):
+    def broken_backfill(db):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(main, "backfill_pricing_history", broken_backfill)
+    with pytest.raises(RuntimeError):
+        with TestClient(main.app):
+            pass
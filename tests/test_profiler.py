@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from profiler import SamplingProfiler, profiler
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    yield
+    profiler.stop()
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiler_samples_busy_thread():
+    sampler = SamplingProfiler()
+    sampler.start(duration_seconds=5, interval_ms=1)
+    busy_wait(0.2)
+    sampler.stop()
+
+    assert not sampler.active
+    assert sampler.sample_count > 0
+    assert "busy_wait" in sampler.collapsed()
+
+    profile = sampler.speedscope()
+    names = {frame["name"] for frame in profile["shared"]["frames"]}
+    assert "busy_wait" in names
+    assert len(profile["profiles"][0]["samples"]) == len(profile["profiles"][0]["weights"])
+
+
+def test_profiler_stops_after_duration():
+    sampler = SamplingProfiler()
+    sampler.start(duration_seconds=0.05, interval_ms=1)
+    time.sleep(0.3)
+    assert not sampler.active
+
+
+def test_admin_endpoints_require_token(client, monkeypatch):
+    assert client.get("/admin/profiler/status").status_code == 403
+    assert client.get("/admin/profiler/status", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    monkeypatch.delenv("ADMIN_TOKEN")
+    assert client.get("/admin/profiler/status", headers=ADMIN_HEADERS).status_code == 403
+
+
+def test_profiler_stops_after_request_budget(client):
+    response = client.post("/admin/profiler/start", json={"max_requests": 2, "duration_seconds": None}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.json()["active"]
+    assert client.post("/admin/profiler/start", json={"max_requests": 2}, headers=ADMIN_HEADERS).status_code == 409
+
+    client.get("/pricing/")
+    assert client.get("/admin/profiler/status", headers=ADMIN_HEADERS).json()["remaining_requests"] == 1
+    client.get("/pricing/")
+    assert not client.get("/admin/profiler/status", headers=ADMIN_HEADERS).json()["active"]
+
+    collapsed = client.get("/admin/profiler/profile", params={"format": "collapsed"}, headers=ADMIN_HEADERS)
+    assert collapsed.status_code == 200
+    speedscope = client.get("/admin/profiler/profile", headers=ADMIN_HEADERS).json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+
+
+def test_restart_leaves_a_single_sampler_thread():
+    import threading
+
+    sampler = SamplingProfiler()
+    for _ in range(20):
+        sampler.start(duration_seconds=5, interval_ms=1)
+        sampler.stop()
+    sampler.start(duration_seconds=5, interval_ms=1)
+    try:
+        samplers = [thread for thread in threading.enumerate() if thread.name == "sampling-profiler"]
+        assert len(samplers) == 1
+    finally:
+        sampler.stop()
+
+
+def test_requests_from_previous_session_do_not_count():
+    sampler = SamplingProfiler()
+    sampler.start(duration_seconds=5, max_requests=2)
+    old_session = sampler.session
+    sampler.stop()
+    sampler.start(duration_seconds=5, max_requests=2)
+    try:
+        sampler.request_finished(old_session)
+        assert sampler.remaining_requests == 2
+        sampler.request_finished(sampler.session)
+        assert sampler.remaining_requests == 1
+    finally:
+        sampler.stop()
+
+
+def test_start_always_has_a_deadline_and_minimum_interval(client):
+    response = client.post("/admin/profiler/start", json={"duration_seconds": None, "max_requests": 1000}, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    status = response.json()
+    assert status["deadline"] == pytest.approx(status["started_at"] + 300)
+    client.post("/admin/profiler/stop", headers=ADMIN_HEADERS)
+
+    response = client.post("/admin/profiler/start", json={"interval_ms": 1}, headers=ADMIN_HEADERS)
+    assert response.status_code == 400